@@ -1,11 +1,17 @@
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 import uuid
-import boto3
 import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize Boto3 client
-connect_client = boto3.client("connect")
+# Upper bound on concurrent list_instances calls across regions
+MAX_REGION_WORKERS = 10
+
+# Page size for list_instances; 10 is the maximum the Connect API allows
+LIST_INSTANCES_PAGE_SIZE = 10
 
 # Set page configuration
 st.set_page_config(
@@ -14,10 +20,41 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Function to get the boto3 session shared by all Connect clients
+# boto3 is imported here so the SDK is only loaded once a region is selected
+
+
+@st.cache_resource(show_spinner=False)
+def get_boto_session():
+    import boto3
+    return boto3.session.Session()
+
+# Function to get the lock guarding client creation on the shared session
+# boto3 sessions are not thread-safe and each browser session runs the script
+# on its own thread, so the lock is cached to be shared by the whole process
+# rather than recreated with the script's globals on every run
+
+
+@st.cache_resource(show_spinner=False)
+def get_boto_session_lock():
+    return threading.Lock()
+
+# Function to get a Connect client for a region, reused across reruns
+
+
+@st.cache_resource(show_spinner=False)
+def get_connect_client(region):
+    session = get_boto_session()
+    with get_boto_session_lock():
+        return session.client('connect', region_name=region)
+
 # File paths for saved selections
 SELECTED_REGIONS_FILE = "selected_regions.csv"
 SELECTED_INSTANCES_FILE = "selected_instances.csv"
-INSTANCES_CACHE_FILE = "instances_cache.csv"
+INSTANCES_CACHE_FILE = "instances_cache.parquet"
+# Regions that listed successfully into the instances cache, including those
+# with no instances
+INSTANCES_CACHE_REGIONS_FILE = "instances_cache_regions.csv"
 
 # Define AWS regions where Amazon Connect is available
 # Using a dictionary to map region codes to their display names
@@ -38,6 +75,38 @@ CONNECT_REGION_MAP = {
 REGION_CODES = list(CONNECT_REGION_MAP.keys())
 REGION_DISPLAY_NAMES = list(CONNECT_REGION_MAP.values())
 
+# Categorical dtype for the Region column, so filters compare integer codes
+REGION_DTYPE = pd.CategoricalDtype(REGION_CODES)
+
+# Reverse mapping from display names back to region codes
+DISPLAY_TO_CODE = {v: k for k, v in CONNECT_REGION_MAP.items()}
+
+# Mock data for the management tables
+ACCOUNTS_DATA = {
+    "Email": ["agent1@example.com", "supervisor1@example.com", "admin1@example.com"],
+    "Username": ["agent1", "supervisor1", "admin1"],
+    "First Name": ["agent1", "supervisor1", "admin1"],
+    "Last Name": ["test", "test", "test"],
+    "User Group": ["AG1", "AG2", "AG3"],
+    "Routing Profile": ["Agent", "Supervisor", "Admin"],
+    "Quick Connect": ["agent1", "supervisor1", "admin1"],
+    "Instance": ["instance-56a4e02c", "instance-56a4e02c", "instance-56a4e02c"]
+}
+
+PROFILES_DATA = {
+    "Name": ["Default Profile", "Sales Profile", "Support Profile"],
+    "Description": ["Default routing", "For sales team", "For support team"],
+    "Queues": ["BasicQueue", "SalesQueue, PremiumQueue", "SupportQueue, BasicQueue"],
+    "Default Outbound Queue": ["BasicQueue", "SalesQueue", "SupportQueue"]
+}
+
+QUICK_CONNECTS_DATA = {
+    "Name": ["Support", "Sales Manager", "Helpdesk"],
+    "Type": ["Queue", "User", "Phone Number"],
+    "Destination": ["SupportQueue", "supervisor1", "+1-555-123-4567"],
+    "Description": ["Support team", "Sales escalations", "External helpdesk"]
+}
+
 # Initialize session state for selected instance and form visibility
 if 'selected_instance' not in st.session_state:
     st.session_state['selected_instance'] = None
@@ -49,16 +118,20 @@ if 'show_quickconnect_form' not in st.session_state:
     st.session_state['show_quickconnect_form'] = False
 if 'instances_df' not in st.session_state:
     st.session_state['instances_df'] = None
+if 'instances_by_region' not in st.session_state:
+    st.session_state['instances_by_region'] = {}
 
-# Function to load saved regions from CSV
+# Function to load saved regions from CSV, read once per process
 
 
+@st.cache_resource(show_spinner=False)
 def load_saved_regions():
     if os.path.exists(SELECTED_REGIONS_FILE):
         try:
-            regions_df = pd.read_csv(SELECTED_REGIONS_FILE)
-            if 'region' in regions_df.columns:
-                return regions_df['region'].tolist()
+            with open(SELECTED_REGIONS_FILE) as f:
+                lines = f.read().splitlines()
+            if lines and lines[0] == 'region':
+                return [line for line in lines[1:] if line]
         except Exception as e:
             st.warning(f"Error loading saved regions: {e}")
     return ["us-east-1"]  # Default to us-east-1 if no saved regions or error
@@ -68,20 +141,23 @@ def load_saved_regions():
 
 def save_regions_to_csv(regions):
     try:
-        regions_df = pd.DataFrame({'region': regions})
-        regions_df.to_csv(SELECTED_REGIONS_FILE, index=False)
+        with open(SELECTED_REGIONS_FILE, 'w') as f:
+            f.write('region\n' + '\n'.join(regions))
+        load_saved_regions.clear()
     except Exception as e:
         st.warning(f"Error saving regions: {e}")
 
-# Function to load saved instances from CSV
+# Function to load saved instances from CSV, read once per process
 
 
+@st.cache_resource(show_spinner=False)
 def load_saved_instances():
     if os.path.exists(SELECTED_INSTANCES_FILE):
         try:
-            instances_df = pd.read_csv(SELECTED_INSTANCES_FILE)
-            if 'instance_id' in instances_df.columns:
-                return instances_df['instance_id'].tolist()
+            with open(SELECTED_INSTANCES_FILE) as f:
+                lines = f.read().splitlines()
+            if lines and lines[0] == 'instance_id':
+                return [line for line in lines[1:] if line]
         except Exception as e:
             st.warning(f"Error loading saved instances: {e}")
     return []
@@ -91,60 +167,188 @@ def load_saved_instances():
 
 def save_instances_to_csv(instance_ids):
     try:
-        instances_df = pd.DataFrame({'instance_id': instance_ids})
-        instances_df.to_csv(SELECTED_INSTANCES_FILE, index=False)
+        with open(SELECTED_INSTANCES_FILE, 'w') as f:
+            f.write('instance_id\n' + '\n'.join(instance_ids))
+        load_saved_instances.clear()
     except Exception as e:
         st.warning(f"Error saving instances: {e}")
 
+# Function to list the instance summaries of one region with a boto3 client
+
+
+def list_instance_summaries(connect):
+    paginator = connect.get_paginator('list_instances')
+    pages = paginator.paginate(
+        PaginationConfig={'PageSize': LIST_INSTANCES_PAGE_SIZE})
+    summaries = []
+    for page in pages:
+        summaries.extend(page['InstanceSummaryList'])
+    return summaries
+
+# Function to list instance summaries across regions on a thread pool
+
+
+def list_instances_threaded(regions):
+    # Clients are created on this script run's thread; get_connect_client holds
+    # the process-wide session lock while doing so, and calls on a client are
+    # thread-safe
+    results = [None] * len(regions)
+    futures = {}
+    with ThreadPoolExecutor(max_workers=min(len(regions), MAX_REGION_WORKERS)) as executor:
+        for index, region in enumerate(regions):
+            try:
+                connect = get_connect_client(region)
+            except Exception as e:
+                # A region whose client can't be built falls back like a failed call
+                results[index] = e
+                continue
+            futures[index] = executor.submit(list_instance_summaries, connect)
+        # Store each result at its region's position so results line up with regions
+        for index, future in futures.items():
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = e
+    return results
+
+# Function to get the aioboto3 session shared by all async fetches
+# aioboto3 is imported here so it is only loaded when instances are fetched
+
+
+@st.cache_resource(show_spinner=False)
+def get_aioboto_session():
+    import aioboto3
+    return aioboto3.Session()
+
+# Function to list instance summaries across regions on one event loop
+# Clients are bound to the event loop, so unlike the boto3 path they are
+# created per fetch from the cached session rather than cached themselves
+
+
+async def list_instances_async(session, regions):
+    async def list_one(region):
+        async with session.client('connect', region_name=region) as connect:
+            paginator = connect.get_paginator('list_instances')
+            pages = paginator.paginate(
+                PaginationConfig={'PageSize': LIST_INSTANCES_PAGE_SIZE})
+            summaries = []
+            async for page in pages:
+                summaries.extend(page['InstanceSummaryList'])
+            return summaries
+
+    return await asyncio.gather(*[list_one(region) for region in regions],
+                                return_exceptions=True)
+
+# Function to list instance summaries per region, using aioboto3 when it
+# imports and sets up cleanly and falling back to boto3 on a thread pool otherwise
+# Each result is either the region's summaries or the exception raised
+
+
+def fetch_instance_summaries(regions):
+    try:
+        session = get_aioboto_session()
+    except Exception:
+        # Missing or broken install, e.g. mismatched aiobotocore/botocore pins
+        return list_instances_threaded(regions)
+    # The session is shared across script threads and clients are created from
+    # it during the fetch, so concurrent fetches are serialized on the lock
+    with get_boto_session_lock():
+        return asyncio.run(list_instances_async(session, regions))
+
 # Function to generate mock Connect instances or fetch real ones
+# Results are memoized per region tuple, so the disk cache and AWS are only
+# consulted on a miss
 
 
+@st.cache_data(ttl=300, show_spinner=False)
 def generate_mock_instances(regions):
     # First check if we have cached results
+    cached_df = None
+    cached_regions = set()
     if os.path.exists(INSTANCES_CACHE_FILE):
         try:
-            cached_df = pd.read_csv(INSTANCES_CACHE_FILE)
-            # Filter by the selected regions
-            cached_df = cached_df[cached_df['Region'].isin(regions)]
-            if not cached_df.empty:
-                return cached_df
+            disk_df = pd.read_parquet(INSTANCES_CACHE_FILE)
+            disk_df['Region'] = disk_df['Region'].astype(REGION_DTYPE)
+            disk_regions = set()
+            if os.path.exists(INSTANCES_CACHE_REGIONS_FILE):
+                with open(INSTANCES_CACHE_REGIONS_FILE) as f:
+                    disk_regions.update(f.read().splitlines()[1:])
+            cached_df, cached_regions = disk_df, disk_regions
+            # Filter by the selected regions, using it only if all are cached
+            region_df = cached_df[cached_df['Region'].isin(regions)]
+            if cached_regions >= set(regions):
+                return region_df
         except Exception:
             # If there's an error loading the cache, continue to fetch new data
             pass
 
-    instances = []
-    for region in regions:
+    ids, aliases, regions_col = [], [], []
+    listed_regions = set()
+    if regions:
+        # Fan the per-region API calls out concurrently; each call is I/O bound
+        results = fetch_instance_summaries(regions)
+        for region, summaries in zip(regions, results):
+            if isinstance(summaries, Exception):
+                # If there's an error fetching instances, create mock data
+                st.warning(
+                    f"Error fetching instances for region {region}: {summaries}")
+                ids.extend(f"instance-{uuid.uuid4().hex[:8]}"
+                           for _ in range(3))
+                aliases.extend(f"MockInstance-{i}" for i in range(1, 4))
+                regions_col.extend([region] * 3)
+                continue
+            listed_regions.add(region)
+            ids.extend(i['Id'] for i in summaries)
+            aliases.extend(i.get('InstanceAlias', 'No Alias')
+                           for i in summaries)
+            regions_col.extend([region] * len(summaries))
+
+    instances_df = pd.DataFrame({
+        "Instance ID": ids,
+        "Region": pd.Categorical(regions_col, dtype=REGION_DTYPE),
+        "Instance Alias": aliases
+    })
+
+    # Cache the results of the regions that listed successfully, recording them
+    # so regions without instances still count as cached; mock data for failed
+    # regions is left out so they are listed again on the next miss
+    if listed_regions:
+        cache_df = instances_df[instances_df['Region'].isin(listed_regions)]
+        # Keep the cached instances of other regions alongside the new ones
+        if cached_df is not None:
+            cache_df = pd.concat(
+                [cached_df[~cached_df['Region'].isin(listed_regions)], cache_df],
+                ignore_index=True)
         try:
-            connect = boto3.client('connect', region_name=region)
-            res = connect.list_instances()
-            for i in res['InstanceSummaryList']:
-                instances.append({
-                    "Instance ID": i['Id'],
-                    "Region": region,
-                    "Instance Alias": i.get('InstanceAlias', 'No Alias')
-                })
-        except Exception as e:
-            # If there's an error fetching instances, create mock data
-            st.warning(f"Error fetching instances for region {region}: {e}")
-            for i in range(1, 4):
-                instance_id = f"instance-{uuid.uuid4().hex[:8]}"
-                instances.append({
-                    "Instance ID": instance_id,
-                    "Region": region,
-                    "Instance Alias": f"MockInstance-{i}"
-                })
-
-    instances_df = pd.DataFrame(instances)
-
-    # Cache the results for future use
-    if not instances_df.empty:
-        try:
-            instances_df.to_csv(INSTANCES_CACHE_FILE, index=False)
+            cache_df.to_parquet(INSTANCES_CACHE_FILE, index=False,
+                                engine='pyarrow', compression='zstd')
+            with open(INSTANCES_CACHE_REGIONS_FILE, 'w') as f:
+                f.write('region\n' + '\n'.join(sorted(cached_regions | listed_regions)))
         except Exception:
             pass
 
     return instances_df
 
+# Functions to build the mock management tables once per process
+# The column dicts are built straight into Arrow tables, so st.dataframe skips
+# the pandas to Arrow conversion (it still serializes the table on each call),
+# and cache_resource avoids copying them on every rerun
+
+
+@st.cache_resource(show_spinner=False)
+def get_accounts_table():
+    return pa.table(ACCOUNTS_DATA)
+
+
+@st.cache_resource(show_spinner=False)
+def get_profiles_table():
+    return pa.table(PROFILES_DATA)
+
+
+@st.cache_resource(show_spinner=False)
+def get_quick_connects_table():
+    return pa.table(QUICK_CONNECTS_DATA)
+
 # Functions to toggle form visibility
 
 
@@ -159,76 +363,117 @@ def toggle_routing_form():
 def toggle_quickconnect_form():
     st.session_state['show_quickconnect_form'] = not st.session_state['show_quickconnect_form']
 
+# Callbacks to persist selections only when the user changes them
+
+
+def on_regions_change():
+    regions = [DISPLAY_TO_CODE[v]
+               for v in st.session_state['region_multiselect']]
+    st.session_state['selected_regions'] = regions
+    # Force the instances to be reloaded only if the set of regions changed
+    regions_sorted = tuple(sorted(regions))
+    if regions_sorted != st.session_state['selected_regions_sorted']:
+        st.session_state['selected_regions_sorted'] = regions_sorted
+        st.session_state['instances_df'] = None
+    save_regions_to_csv(regions)
+
+
+def on_instances_change():
+    instance_ids = st.session_state['instance_multiselect']
+    st.session_state['selected_instances'] = instance_ids
+    save_instances_to_csv(instance_ids)
+
 
 # Main title
 st.title("Amazon Connect Management Portal")
 
-# Load previously selected regions from CSV
-default_regions = load_saved_regions()
+# Load previously selected regions and instances from CSV on first run
+if 'selected_regions' not in st.session_state:
+    st.session_state['selected_regions'] = [
+        r for r in load_saved_regions() if r in CONNECT_REGION_MAP]
+    st.session_state['selected_regions_sorted'] = tuple(
+        sorted(st.session_state['selected_regions']))
+if 'selected_instances' not in st.session_state:
+    st.session_state['selected_instances'] = list(load_saved_instances())
+
+default_regions = st.session_state['selected_regions']
 
 # Convert default regions to display names for the multiselect
 default_display_regions = [CONNECT_REGION_MAP[r]
                            for r in default_regions if r in CONNECT_REGION_MAP]
 
 # Multi-select box for regions with formatted display names
-selected_display_regions = st.multiselect(
+st.multiselect(
     "Select Connect Regions",
     REGION_DISPLAY_NAMES,
-    default=default_display_regions
+    default=default_display_regions,
+    key='region_multiselect',
+    on_change=on_regions_change
 )
 
-# Convert the selected display names back to region codes
-selected_regions = [key for key, value in CONNECT_REGION_MAP.items()
-                    if value in selected_display_regions]
-
-# Save the selected regions to CSV when they change
-if selected_regions != default_regions:
-    save_regions_to_csv(selected_regions)
+# Region codes for the current selection, kept in sync by on_regions_change
+selected_regions = st.session_state['selected_regions']
 
 # Display Connect instances based on selected regions
 if selected_regions:
     # If instances haven't been loaded yet, or if the selected regions changed
-    if st.session_state['instances_df'] is None or set(selected_regions) != set(default_regions):
-        st.session_state['instances_df'] = generate_mock_instances(
-            selected_regions)
+    if st.session_state['instances_df'] is None:
+        instances_by_region = st.session_state['instances_by_region']
+        new_regions = set(selected_regions) - instances_by_region.keys()
+        stale_regions = instances_by_region.keys() - set(selected_regions)
+
+        # Only fetch the regions that were added since the last load
+        if new_regions:
+            fetched_df = generate_mock_instances(tuple(sorted(new_regions)))
+            for region in new_regions:
+                instances_by_region[region] = fetched_df[fetched_df['Region'] == region]
+        for region in stale_regions:
+            del instances_by_region[region]
+
+        st.session_state['instances_df'] = pd.concat(
+            [instances_by_region[r] for r in selected_regions])
 
     instances_df = st.session_state['instances_df']
 
     # Create a dictionary mapping instance_id to display name (instance_id, region)
-    instance_display_map = {}
-    for idx, row in instances_df.iterrows():
-        instance_id = row["Instance ID"]
-        instance_alias = row["Instance Alias"]
-        region = row["Region"]
-        display_name = f"{instance_id}, {instance_alias}, {CONNECT_REGION_MAP[region]}"
-        instance_display_map[instance_id] = display_name
+    ids = instances_df["Instance ID"].to_numpy()
+    aliases = instances_df["Instance Alias"].to_numpy()
+    # Region is categorical, so map only touches the handful of region codes
+    region_suffix = instances_df["Region"].map(CONNECT_REGION_MAP).to_numpy()
+    displays = [f"{instance_id}, {instance_alias}, {suffix}"
+                for instance_id, instance_alias, suffix in zip(ids, aliases, region_suffix)]
+    instance_display_map = dict(zip(ids, displays))
 
     # Create a list of instance IDs and their display names
     instance_ids = list(instance_display_map.keys())
 
-    # Load previously selected instances
-    default_instances = load_saved_instances()
+    # Previously selected instances
+    default_instances = st.session_state['selected_instances']
     # Filter to ensure only valid instances are selected
-    default_instances = [i for i in default_instances if i in instance_ids]
+    valid_ids = set(instance_ids)
+    default_instances = [i for i in default_instances if i in valid_ids]
 
     # Create a multi-select box for instances
-    selected_instance_ids = st.multiselect(
+    st.multiselect(
         "Select Connect Instances",
         options=instance_ids,
         default=default_instances,
-        format_func=lambda x: instance_display_map[x]
+        format_func=lambda x: instance_display_map[x],
+        key='instance_multiselect',
+        on_change=on_instances_change
     )
 
-    # Save the selected instances to CSV when they change
-    if set(selected_instance_ids) != set(default_instances):
-        save_instances_to_csv(selected_instance_ids)
-
-    # Tabs for different management sections
-    tabs = st.tabs(
-        ["Account Management", "Routing Profile Management", "Quick Connect Management"])
+    # Section selector for the different management sections; unlike st.tabs,
+    # only the active section is built on each rerun
+    st.radio(
+        "Section",
+        ["Account Management", "Routing Profile Management", "Quick Connect Management"],
+        horizontal=True,
+        key='active_tab'
+    )
 
     # Account Management Tab
-    with tabs[0]:
+    if st.session_state['active_tab'] == "Account Management":
         st.header("Account Management")
 
         # Add button to show/hide the form
@@ -260,20 +505,10 @@ if selected_regions:
 
         # Display mock account data
         st.subheader("Existing Accounts")
-        accounts_data = {
-            "Email": ["agent1@example.com", "supervisor1@example.com", "admin1@example.com"],
-            "Username": ["agent1", "supervisor1", "admin1"],
-            "First Name": ["agent1", "supervisor1", "admin1"],
-            "Last Name": ["test", "test", "test"],
-            "User Group": ["AG1", "AG2", "AG3"],
-            "Routing Profile": ["Agent", "Supervisor", "Admin"],
-            "Quick Connect": ["agent1", "supervisor1", "admin1"],
-            "Instance": ["instance-56a4e02c", "instance-56a4e02c", "instance-56a4e02c"]
-        }
-        st.dataframe(pd.DataFrame(accounts_data))
+        st.dataframe(get_accounts_table())
 
     # Routing Profile Management Tab
-    with tabs[1]:
+    elif st.session_state['active_tab'] == "Routing Profile Management":
         st.header("Routing Profile Management")
 
         # Add button to show/hide the form
@@ -312,16 +547,10 @@ if selected_regions:
 
         # Display mock routing profile data
         st.subheader("Existing Routing Profiles")
-        profiles_data = {
-            "Name": ["Default Profile", "Sales Profile", "Support Profile"],
-            "Description": ["Default routing", "For sales team", "For support team"],
-            "Queues": ["BasicQueue", "SalesQueue, PremiumQueue", "SupportQueue, BasicQueue"],
-            "Default Outbound Queue": ["BasicQueue", "SalesQueue", "SupportQueue"]
-        }
-        st.dataframe(pd.DataFrame(profiles_data))
+        st.dataframe(get_profiles_table())
 
     # Quick Connect Management Tab
-    with tabs[2]:
+    elif st.session_state['active_tab'] == "Quick Connect Management":
         st.header("Quick Connect Management")
 
         # Add button to show/hide the form
@@ -360,13 +589,7 @@ if selected_regions:
 
         # Display mock quick connect data
         st.subheader("Existing Quick Connects")
-        quick_connects_data = {
-            "Name": ["Support", "Sales Manager", "Helpdesk"],
-            "Type": ["Queue", "User", "Phone Number"],
-            "Destination": ["SupportQueue", "supervisor1", "+1-555-123-4567"],
-            "Description": ["Support team", "Sales escalations", "External helpdesk"]
-        }
-        st.dataframe(pd.DataFrame(quick_connects_data))
+        st.dataframe(get_quick_connects_table())
 else:
     st.warning("Please select at least one AWS region.")
 